@@ -0,0 +1,66 @@
+import json
+import os
+import timeit
+import msgpack
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from main import get_tours_hardcoding, get_continued_tours_hardcoding
+from wire_format import COMPACT_JSON_MEDIA_TYPE, COMPACT_MSGPACK_MEDIA_TYPE, decode_delta, decode_output
+
+NUMBER = 2000
+
+def decode_default(body: bytes) -> dict:
+  return json.loads(body)
+
+def decode_compact(content: dict) -> dict:
+  if "delta" in content:
+    return {**content, "delta": decode_delta(content["delta"])}
+  return {**content, "output": decode_output(content["output"])}
+
+def decode_compact_json(body: bytes) -> dict:
+  return decode_compact(json.loads(body))
+
+def decode_compact_msgpack(body: bytes) -> dict:
+  return decode_compact(msgpack.unpackb(body, raw=False))
+
+FORMATS = [
+  ("json", None, decode_default),
+  ("compact+json", COMPACT_JSON_MEDIA_TYPE, decode_compact_json),
+  ("compact+msgpack", COMPACT_MSGPACK_MEDIA_TYPE, decode_compact_msgpack),
+]
+
+# 각 포맷의 크기와 디코딩 시간을 baseline(기본 JSON 전체 응답) 대비 비율로 출력한다.
+def bench(name: str, render, baseline_render=None) -> None:
+  print(f"[{name}]")
+  baseline_body = (baseline_render or render)(None).body
+  baseline_seconds = timeit.timeit(lambda: decode_default(baseline_body), number=NUMBER) / NUMBER
+  expected = decode_default(render(None).body)
+  for format_name, accept, decode in FORMATS:
+    body = render(accept).body
+    assert decode(body) == expected
+    if body == baseline_body:
+      seconds = baseline_seconds
+    else:
+      seconds = timeit.timeit(lambda: decode(body), number=NUMBER) / NUMBER
+    print(
+      f"  {format_name:<16} {len(body):>6} bytes ({len(body) / len(baseline_body):.0%})"
+      f"  decode {seconds * 1e6:>7.1f} us ({seconds / baseline_seconds:.0%})"
+    )
+
+if __name__ == "__main__":
+  for location in ["협재 해변", "우도", "한라산"]:
+    bench(f"tours {location}", lambda accept: get_tours_hardcoding(location, accept=accept))
+  for response_id in ["1", "2", "3"]:
+    bench(
+      f"continue {response_id}",
+      lambda accept: get_continued_tours_hardcoding(response_id, accept=accept)
+    )
+  # get_tours_hardcoding 호출로 부모 응답이 이미 저장되어 있으므로 delta 응답을 받는다.
+  for response_id in ["1", "2", "3"]:
+    bench(
+      f"continue {response_id} delta",
+      lambda accept: get_continued_tours_hardcoding(response_id, delta=True, accept=accept),
+      lambda accept: get_continued_tours_hardcoding(response_id, accept=accept)
+    )
@@ -1,12 +1,29 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Header, Query
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import time
+from wire_format import tours_response
+from response_store import ResponseStore, is_tours_output
+from router import (
+  FAST,
+  FAST_MODEL,
+  LOCAL,
+  SEARCH,
+  SEARCH_MODEL,
+  ResponseLineage,
+  RoutingStats,
+  classify_condition,
+  fast_tier_prompt,
+  filter_locally,
+  narrow_output,
+  parse_fast_tier_indexes,
+)
 
 app = FastAPI()
 
@@ -23,6 +40,9 @@ app.mount("/images", StaticFiles(directory="images"), name="images")
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 valid_access_code = os.getenv("VALID_ACCESS_CODE")
+response_store = ResponseStore()
+response_lineage = ResponseLineage()
+routing_stats = RoutingStats()
 
 class CodeRequest(BaseModel):
   access_code: str
@@ -37,24 +57,31 @@ def verify_code(request: CodeRequest):
 @app.get("/api/tours")
 def get_tours(
   location: str = Query(None),
-  access_code: str = Query(None)
+  access_code: str = Query(None),
+  accept: str = Header(None)
 ):
   if access_code == valid_access_code:
-    return get_tours_from_open_ai(location)
+    return get_tours_from_open_ai(location, accept)
   else:
-    return get_tours_hardcoding(location)
+    return get_tours_hardcoding(location, accept)
 
 @app.get("/api/tours/continue")
 def get_continued_tours(
   access_code: str = Query(None),
   previous_response_id: str = Query(None),
-  condition: str = Query(None)
-) -> JSONResponse:
+  condition: str = Query(None),
+  delta: bool = Query(False),
+  accept: str = Header(None)
+) -> Response:
   if access_code == valid_access_code:
-    return get_continued_tours_from_open_ai(previous_response_id, condition)
+    return get_continued_tours_from_open_ai(previous_response_id, condition, delta, accept)
   else:
-    return get_continued_tours_hardcoding(previous_response_id)
+    return get_continued_tours_hardcoding(previous_response_id, delta, accept)
   
+@app.get("/api/routing-stats")
+def get_routing_stats():
+  return JSONResponse(content=routing_stats.snapshot())
+
 @app.get("/api/destinations")
 def get_destinations():
   destinations = [
@@ -79,7 +106,7 @@ def get_destinations():
   ]
   return JSONResponse(content=destinations)
 
-def get_tours_from_open_ai(location: str = None) -> JSONResponse:
+def get_tours_from_open_ai(location: str = None, accept: str = None) -> Response:
   prompt = f"""
   마이리얼트립에서 제주도의 {location}을 포함하는 여행 상품을 최대 10개 추천해줘.
   
@@ -170,16 +197,13 @@ def get_tours_from_open_ai(location: str = None) -> JSONResponse:
   """
 
   openai_response = client.responses.create(
-    model="gpt-4o",
+    model=SEARCH_MODEL,
     tools=[{"type": "web_search_preview"}],
     input=prompt
   )
 
   try:
-    return JSONResponse(content={
-      "id": openai_response.id,
-      "output": json.loads(openai_response.output_text)
-    })
+    output = json.loads(openai_response.output_text)
   except Exception as e:
     return JSONResponse(
       status_code=500,
@@ -189,7 +213,13 @@ def get_tours_from_open_ai(location: str = None) -> JSONResponse:
       }
     )
 
-def get_tours_hardcoding(location: str = None) -> JSONResponse:
+  response_store.record(openai_response.id, output)
+  return tours_response({
+    "id": openai_response.id,
+    "output": output
+  }, accept)
+
+def get_tours_hardcoding(location: str = None, accept: str = None) -> Response:
   if location == "협재 해변":
     response = {
       "filters": [
@@ -499,33 +529,73 @@ def get_tours_hardcoding(location: str = None) -> JSONResponse:
   else:
     id = '0'
 
-  return JSONResponse(content={
+  response_store.record(id, response)
+  return tours_response({
     "id": id,
     "output": response
-  })
+  }, accept)
 
 def get_continued_tours_from_open_ai(
   previous_response_id: str,
-  condition: str
-) -> JSONResponse:
+  condition: str,
+  delta: bool = False,
+  accept: str = None
+) -> Response:
+  if response_lineage.is_expired(previous_response_id):
+    return JSONResponse(
+      status_code=404,
+      content={
+          "error": "이전 응답을 찾을 수 없습니다",
+          "previous_response_id": previous_response_id
+      }
+    )
+
+  upstream_id, local_conditions = response_lineage.resolve(previous_response_id)
+  parent_output = response_store.get(previous_response_id)
+  tier = classify_condition(condition, parent_output)
+
+  if tier == LOCAL:
+    started = time.perf_counter()
+    output = filter_locally(condition, parent_output)
+    routing_stats.record(LOCAL, time.perf_counter() - started, empty=not output["items"])
+    return continued_tours_response(previous_response_id, {
+      "id": response_lineage.add(previous_response_id, condition),
+      "output": output
+    }, delta, accept)
+
+  if tier == FAST:
+    started = time.perf_counter()
+    output = get_narrowed_tours_from_fast_model(condition, parent_output)
+    routing_stats.record(
+      FAST,
+      time.perf_counter() - started,
+      served=output is not None,
+      empty=output is not None and not output["items"]
+    )
+    if output is not None:
+      return continued_tours_response(previous_response_id, {
+        "id": response_lineage.add(previous_response_id, condition),
+        "output": output
+      }, delta, accept)
+
+  conditions = "\n  ".join(local_conditions + [condition])
   prompt = f"""
   아까의 적용 조건에 다음 조건을 추가해서 다시 최대 10개의 여행상품을 추천해줘.
-  {condition}
+  {conditions}
   """
 
+  started = time.perf_counter()
   openai_response = client.responses.create(
-    model="gpt-4o",
-    previous_response_id=previous_response_id,
+    model=SEARCH_MODEL,
+    previous_response_id=upstream_id,
     tools=[{"type": "web_search_preview"}],
     input=prompt
   )
 
   try:
-    return JSONResponse(content={
-      "id": openai_response.id,
-      "output": json.loads(openai_response.output_text)
-    })
+    output = json.loads(openai_response.output_text)
   except Exception as e:
+    routing_stats.record(SEARCH, time.perf_counter() - started, served=False)
     return JSONResponse(
       status_code=500,
       content={
@@ -534,8 +604,40 @@ def get_continued_tours_from_open_ai(
       }
     )
 
-def get_continued_tours_hardcoding(previous_response_id: str) -> JSONResponse:
-  if previous_response_id == '1':
+  routing_stats.record(
+    SEARCH,
+    time.perf_counter() - started,
+    empty=is_tours_output(output) and not output.get("items")
+  )
+  return continued_tours_response(previous_response_id, {
+    "id": openai_response.id,
+    "output": output
+  }, delta, accept)
+
+# 이전 응답의 상품 안에서만 고르는 조건은 웹 검색 없이 작은 모델에게 남길 link만 받는다.
+def get_narrowed_tours_from_fast_model(condition: str, parent_output: dict) -> dict:
+  try:
+    openai_response = client.responses.create(
+      model=FAST_MODEL,
+      input=fast_tier_prompt(condition, parent_output)
+    )
+  except Exception as e:
+    return None
+
+  indexes = parse_fast_tier_indexes(openai_response.output_text, parent_output)
+  if indexes is None:
+    return None
+  return narrow_output(parent_output, indexes)
+
+def get_continued_tours_hardcoding(
+  previous_response_id: str,
+  delta: bool = False,
+  accept: str = None
+) -> Response:
+  # 이어진 응답은 부모와 다른 id("<부모 id>-c")를 가져야 delta 기준을 구분할 수 있고,
+  # 이어진 응답에서 다시 이어 요청해도 같은 결과를 내려준다.
+  parent_id = previous_response_id.removesuffix("-c") if previous_response_id else previous_response_id
+  if parent_id == '1':
     response = {
       "filters": [
         {
@@ -572,7 +674,7 @@ def get_continued_tours_hardcoding(previous_response_id: str) -> JSONResponse:
         }
       ]
     }
-  elif previous_response_id == '2':
+  elif parent_id == '2':
     response = {
       "filters": [
         {
@@ -635,7 +737,7 @@ def get_continued_tours_hardcoding(previous_response_id: str) -> JSONResponse:
         }
       ]
     }
-  elif previous_response_id == '3':
+  elif parent_id == '3':
     response = {
       "filters": [
         {
@@ -704,7 +806,25 @@ def get_continued_tours_hardcoding(previous_response_id: str) -> JSONResponse:
     }
   ]
   response["filters"] = common_filters + response["filters"]
-  return JSONResponse(content={
-    "id": previous_response_id,
+  return continued_tours_response(previous_response_id, {
+    "id": f"{parent_id}-c" if parent_id else previous_response_id,
     "output": response
-  })
\ No newline at end of file
+  }, delta, accept)
+
+# delta를 요청했고 이전 응답이 저장되어 있으면 이전 응답 대비 바뀐 부분만 내려준다.
+def continued_tours_response(
+  previous_response_id: str,
+  content: dict,
+  delta: bool = False,
+  accept: str = None
+) -> Response:
+  changes = response_store.diff(previous_response_id, content["output"]) if delta else None
+  response_store.record(content["id"], content["output"])
+  if changes is None:
+    return tours_response(content, accept)
+
+  return tours_response({
+    "id": content["id"],
+    "base_id": previous_response_id,
+    "delta": changes
+  }, accept)
\ No newline at end of file
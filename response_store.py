@@ -0,0 +1,151 @@
+import json
+from collections import OrderedDict
+from threading import Lock
+
+MAX_STORED_RESPONSES = 500
+MAX_STORED_ITEMS = 5000
+
+def _fingerprint(value) -> str:
+  return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+def item_link(item: dict) -> str:
+  link = item.get("link")
+  return link if isinstance(link, str) and link else None
+
+def _item_key(item: dict) -> str:
+  return item_link(item) or _fingerprint(item)
+
+def has_unique_links(items: list) -> bool:
+  links = [item_link(item) for item in items]
+  return all(links) and len(set(links)) == len(links)
+
+# delta는 link와 filter key로만 상품과 필터를 가리키므로, 둘 다 빠짐없고 겹치지 않아야 한다.
+def _is_addressable(output: dict) -> bool:
+  filter_keys = [filter.get("key") for filter in output.get("filters", [])]
+  return (
+    has_unique_links(output.get("items", []))
+    and all(isinstance(key, str) for key in filter_keys)
+    and len(set(filter_keys)) == len(filter_keys)
+  )
+
+# 모델이 명세와 다른 JSON을 내려줄 수 있으므로, 기록이나 압축 전에 items/filters가 객체 배열인지 확인한다.
+def is_tours_output(output) -> bool:
+  if not isinstance(output, dict):
+    return False
+  items = output.get("items", [])
+  filters = output.get("filters", [])
+  return (
+    isinstance(items, list)
+    and isinstance(filters, list)
+    and all(isinstance(item, dict) for item in items)
+    and all(
+      isinstance(filter, dict)
+      and (filter.get("options") is None or (
+        isinstance(filter["options"], list)
+        and all(isinstance(option, dict) for option in filter["options"])
+      ))
+      for filter in filters
+    )
+  )
+
+# 상품은 link 기준으로 한 번만 보관하고, 응답은 link 목록과 각 상품의 fingerprint만 기억한다.
+class ResponseStore:
+  def __init__(self, max_responses: int = MAX_STORED_RESPONSES, max_items: int = MAX_STORED_ITEMS):
+    self.max_responses = max_responses
+    self.max_items = max_items
+    self.responses = OrderedDict()
+    self.items = OrderedDict()
+    self.lock = Lock()
+
+  def record(self, response_id: str, output: dict) -> None:
+    if not is_tours_output(output):
+      return
+
+    with self.lock:
+      # 같은 id의 응답은 내용도 같으므로 다시 기록하지 않는다.
+      if response_id in self.responses:
+        self.responses.move_to_end(response_id)
+        return
+
+      entries = []
+      for item in output.get("items", []):
+        link = _item_key(item)
+        self.items[link] = item
+        self.items.move_to_end(link)
+        entries.append((link, _fingerprint(item)))
+
+      self.responses[response_id] = {
+        "addressable": _is_addressable(output),
+        "items": entries,
+        "filters": {filter.get("key"): filter for filter in output.get("filters", [])},
+      }
+      while len(self.responses) > self.max_responses:
+        self.responses.popitem(last=False)
+      while len(self.items) > self.max_items:
+        self.items.popitem(last=False)
+
+  def get(self, response_id: str) -> dict:
+    with self.lock:
+      entry = self.responses.get(response_id)
+      if entry is None:
+        return None
+
+      items = []
+      for link, fingerprint in entry["items"]:
+        item = self.items.get(link)
+        # 다른 응답이 같은 link의 상품을 덮어썼거나 밀려났다면 원래 응답을 복원할 수 없다.
+        if item is None or _fingerprint(item) != fingerprint:
+          return None
+        items.append(item)
+      return {"filters": list(entry["filters"].values()), "items": items}
+
+  def diff(self, parent_id: str, output: dict) -> dict:
+    if not is_tours_output(output):
+      return None
+
+    with self.lock:
+      parent = self.responses.get(parent_id)
+      if parent is None:
+        return None
+      self.responses.move_to_end(parent_id)
+
+    if not parent["addressable"] or not _is_addressable(output):
+      return None
+
+    items = output.get("items", [])
+    links = [item_link(item) for item in items]
+    filters = output.get("filters", [])
+    filter_keys = [filter.get("key") for filter in filters]
+    filter_key_set = set(filter_keys)
+
+    parent_fingerprints = dict(parent["items"])
+    parent_links = [link for link, _ in parent["items"]]
+    link_set = set(links)
+
+    added = [
+      item for link, item in zip(links, items)
+      if parent_fingerprints.get(link) != _fingerprint(item)
+    ]
+    removed = [link for link in parent_links if link not in link_set]
+
+    changed_filters = [
+      filter for filter in filters
+      if parent["filters"].get(filter.get("key")) != filter
+    ]
+    removed_filters = [key for key in parent["filters"] if key not in filter_key_set]
+
+    delta = {
+      "added": added,
+      "removed": removed,
+      "filters": changed_filters,
+      "removed_filters": removed_filters,
+    }
+    kept_links = [link for link in parent_links if link in link_set]
+    new_links = [link for link in links if link not in parent_fingerprints]
+    if links != kept_links + new_links:
+      delta["order"] = links
+    kept_filter_keys = [key for key in parent["filters"] if key in filter_key_set]
+    new_filter_keys = [key for key in filter_keys if key not in parent["filters"]]
+    if filter_keys != kept_filter_keys + new_filter_keys:
+      delta["filter_order"] = filter_keys
+    return delta
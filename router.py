@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import uuid
+from collections import OrderedDict
+from threading import Lock
+from response_store import has_unique_links, item_link
+
+SEARCH_MODEL = os.getenv("SEARCH_MODEL", "gpt-4o")
+FAST_MODEL = os.getenv("FAST_MODEL", "gpt-4o-mini")
+LOCAL_MAX_RESIDUE_LENGTH = int(os.getenv("ROUTER_LOCAL_MAX_RESIDUE_LENGTH", "2"))
+FAST_MAX_CONDITION_LENGTH = int(os.getenv("ROUTER_FAST_MAX_CONDITION_LENGTH", "40"))
+MAX_LINEAGE_ENTRIES = 500
+LOCAL_ID_PREFIX = "local-"
+
+LOCAL = "local"
+FAST = "fast"
+SEARCH = "search"
+TIERS = (LOCAL, FAST, SEARCH)
+
+COMPARATOR_PATTERN = re.compile(r"이하|미만|이상|초과|까지|넘는")
+AMOUNT = r"\d[\d,]*(?:\.\d+)?"
+AMOUNT_PATTERN = re.compile(rf"({AMOUNT})\s*(만|천)?")
+# "15,000원", "1만 5천원", "1.5만원"처럼 쉼표와 만/천 단위를 섞은 금액을 하나로 잡는다.
+PRICE_PATTERN = re.compile(
+  rf"(?<![\d.,])(?=\d)((?:{AMOUNT}\s*만\s*)?(?:{AMOUNT}\s*천\s*)?(?:{AMOUNT})?)\s*원?\s*({COMPARATOR_PATTERN.pattern})"
+)
+PRICE_UNITS = {None: 1, "천": 1000, "만": 10000}
+PRICE_COMPARATORS = {
+  "이하": lambda price, limit: price <= limit,
+  "까지": lambda price, limit: price <= limit,
+  "미만": lambda price, limit: price < limit,
+  "이상": lambda price, limit: price >= limit,
+  "초과": lambda price, limit: price > limit,
+  "넘는": lambda price, limit: price > limit,
+}
+NEGATION_PATTERN = re.compile(r"제외|빼고|말고|아닌")
+NARROWING_PATTERN = re.compile(r"이하|미만|이상|초과|까지|넘는|제외|빼고|말고|중에서|중에|만\b|저렴|싼|비싼|짧|가까운|가능한|있는|없는")
+SEARCH_PATTERN = re.compile(r"새로|다른|추가로|더\s*(찾|추천|보여)|검색|근처|주변|맛집|숙소|카페|렌트|항공")
+TOKEN_SEPARATOR_PATTERN = re.compile(r"[\s,./·~!?()]+")
+FILLER_TOKENS = {
+  "", "가격", "금액", "요금", "로", "으로", "만", "인", "것", "것만", "상품", "상품만",
+  "보여줘", "추천해줘", "조건", "그리고", "및", "또는", "이고", "이면", "중에서",
+}
+
+def _item_value(item: dict, key: str):
+  attributes = item.get("attributes") or {}
+  return attributes[key] if key in attributes else item.get(key)
+
+# 명세상 attributes와 옵션 값은 모두 문자열이어야 한다.
+# 배열 같은 값이 섞인 부모 응답은 로컬에서 비교할 수 없으므로 local/fast 단계로 보내지 않는다.
+def _has_plain_values(parent_output: dict) -> bool:
+  for item in parent_output["items"]:
+    attributes = item.get("attributes")
+    if attributes is not None and not (
+      isinstance(attributes, dict) and all(isinstance(value, str) for value in attributes.values())
+    ):
+      return False
+
+  for filter in parent_output.get("filters", []):
+    options = filter.get("options") or []
+    if not options:
+      continue
+    if not isinstance(filter.get("key"), str):
+      return False
+    if not all(isinstance(option.get("value"), str) for option in options):
+      return False
+    if not all(
+      isinstance(_item_value(item, filter["key"]), (str, int, float, type(None)))
+      for item in parent_output["items"]
+    ):
+      return False
+  return True
+
+def _parse_price(price) -> float:
+  try:
+    return float(str(price).replace(",", "").replace("원", ""))
+  except ValueError:
+    return None
+
+def _parse_amount(text: str) -> float:
+  return sum(
+    float(match.group(1).replace(",", "")) * PRICE_UNITS[match.group(2)]
+    for match in AMOUNT_PATTERN.finditer(text)
+  )
+
+def _parse_local_constraints(condition: str, parent_output: dict):
+  spans = []
+  price_constraints = []
+  for match in PRICE_PATTERN.finditer(condition):
+    price_constraints.append((PRICE_COMPARATORS[match.group(2)], _parse_amount(match.group(1))))
+    spans.append(match.span())
+
+  # 긴 옵션부터 매칭해서 "4.5시간" 안의 "5시간" 같은 겹치는 옵션을 잘못 잡지 않도록 한다.
+  candidates = []
+  for filter in parent_output.get("filters", []):
+    for option in filter.get("options") or []:
+      for text in {option.get("label"), option.get("value")}:
+        if isinstance(text, str) and len(text) >= 2:
+          candidates.append((text, filter.get("key"), option.get("value")))
+  option_constraints = {}
+  for text, key, value in sorted(candidates, key=lambda candidate: -len(candidate[0])):
+    start = condition.find(text)
+    while start != -1:
+      end = start + len(text)
+      if all(end <= span_start or start >= span_end for span_start, span_end in spans):
+        spans.append((start, end))
+        option_constraints.setdefault(key, set()).add(value)
+      start = condition.find(text, end)
+
+  residue = condition
+  for start, end in sorted(spans, reverse=True):
+    residue = residue[:start] + " " + residue[end:]
+  residue = "".join(
+    token for token in TOKEN_SEPARATOR_PATTERN.split(residue) if token not in FILLER_TOKENS
+  )
+  return price_constraints, option_constraints, residue
+
+def classify_condition(condition: str, parent_output: dict) -> str:
+  if not condition or not parent_output or not parent_output.get("items"):
+    return SEARCH
+  if SEARCH_PATTERN.search(condition) or not _has_plain_values(parent_output):
+    return SEARCH
+
+  if not NEGATION_PATTERN.search(condition):
+    price_constraints, option_constraints, residue = _parse_local_constraints(condition, parent_output)
+    prices_known = all(_parse_price(item.get("price")) is not None for item in parent_output["items"])
+    # 남은 숫자나 비교 표현("4시간 이상")은 로컬에서 해석하지 못한 조건이므로 로컬로 보내지 않는다.
+    if (
+      (price_constraints or option_constraints)
+      and len(residue) <= LOCAL_MAX_RESIDUE_LENGTH
+      and not re.search(r"\d", residue)
+      and not COMPARATOR_PATTERN.search(residue)
+      and (prices_known or not price_constraints)
+    ):
+      return LOCAL
+
+  # fast 단계는 모델이 link로 상품을 고르므로 모든 상품이 서로 다른 link를 가져야 한다.
+  if (
+    len(condition) <= FAST_MAX_CONDITION_LENGTH
+    and NARROWING_PATTERN.search(condition)
+    and has_unique_links(parent_output["items"])
+  ):
+    return FAST
+  return SEARCH
+
+# 부모 응답의 상품 중 남길 상품을 부모 목록의 index로 고르고, 필터 옵션도 남은 상품에 있는 값으로 줄인다.
+# link가 없는 상품끼리 섞이지 않도록 link가 아닌 index로 고른다.
+# 부모 상품 어디에도 없던 옵션 값(예: 공통 위치 필터)은 건드리지 않는다.
+def narrow_output(parent_output: dict, indexes) -> dict:
+  indexes = set(indexes)
+  items = [item for index, item in enumerate(parent_output["items"]) if index in indexes]
+  if not items:
+    return {"filters": [], "items": []}
+
+  filters = []
+  for filter in parent_output.get("filters", []):
+    if not filter.get("options"):
+      filters.append(filter)
+      continue
+    key = filter.get("key")
+    parent_values = {_item_value(item, key) for item in parent_output["items"]}
+    values = {_item_value(item, key) for item in items}
+    filters.append({
+      **filter,
+      "options": [
+        option for option in filter["options"]
+        if option.get("value") in values or option.get("value") not in parent_values
+      ]
+    })
+  return {"filters": filters, "items": items}
+
+def filter_locally(condition: str, parent_output: dict) -> dict:
+  price_constraints, option_constraints, _ = _parse_local_constraints(condition, parent_output)
+  indexes = [
+    index for index, item in enumerate(parent_output["items"])
+    if all(compare(_parse_price(item.get("price")), limit) for compare, limit in price_constraints)
+    and all(_item_value(item, key) in values for key, values in option_constraints.items())
+  ]
+  return narrow_output(parent_output, indexes)
+
+def fast_tier_prompt(condition: str, parent_output: dict) -> str:
+  items = json.dumps(parent_output["items"], ensure_ascii=False, separators=(",", ":"))
+  return f"""
+  아래는 이전에 추천한 여행 상품 목록이야.
+  새로운 상품을 찾거나 추가하지 말고, 이 목록 안에서 다음 조건을 만족하는 상품만 골라줘.
+  {condition}
+
+  응답은 반드시 ``` 코드 블록 없이 {{"links": ["선택한 상품의 link"]}} 형태의 JSON만 순수하게 출력해줘.
+  조건을 만족하는 상품이 없다면 links를 빈 배열로 내려줘.
+
+  [상품 목록]
+  {items}
+  """
+
+# 모델이 고른 link를 부모 목록의 index로 바꾼다. 목록에 없는 link는 버린다.
+def parse_fast_tier_indexes(output_text: str, parent_output: dict) -> list:
+  try:
+    links = json.loads(output_text)["links"]
+  except Exception as e:
+    return None
+  if not isinstance(links, list):
+    return None
+
+  parent_indexes = {item_link(item): index for index, item in enumerate(parent_output["items"])}
+  indexes = [parent_indexes[link] for link in links if isinstance(link, str) and link in parent_indexes]
+  if links and not indexes:
+    return None
+  return indexes
+
+# local/fast 단계에서 만든 응답은 OpenAI에 없는 id를 가지므로,
+# 이후 검색으로 넘어갈 때 이어 붙일 실제 response id와 그 사이에 적용한 조건들을 기억한다.
+class ResponseLineage:
+  def __init__(self, max_entries: int = MAX_LINEAGE_ENTRIES):
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.lock = Lock()
+
+  def add(self, previous_response_id: str, condition: str) -> str:
+    upstream_id, conditions = self.resolve(previous_response_id)
+    response_id = f"{LOCAL_ID_PREFIX}{uuid.uuid4().hex}"
+    with self.lock:
+      self.entries[response_id] = (upstream_id, conditions + [condition])
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+    return response_id
+
+  # local id인데 기록이 없다면 이미 밀려난 것이므로 OpenAI에 넘길 수 없다.
+  # previous_response_id가 없는 요청은 예전처럼 그대로 검색으로 보낸다.
+  def is_expired(self, response_id: str) -> bool:
+    if not response_id or not response_id.startswith(LOCAL_ID_PREFIX):
+      return False
+    with self.lock:
+      return response_id not in self.entries
+
+  def resolve(self, response_id: str):
+    with self.lock:
+      if response_id in self.entries:
+        upstream_id, conditions = self.entries[response_id]
+        return upstream_id, list(conditions)
+    return response_id, []
+
+class RoutingStats:
+  def __init__(self):
+    self.lock = Lock()
+    self.tiers = {
+      tier: {"requests": 0, "served": 0, "missed": 0, "empty": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+      for tier in TIERS
+    }
+
+  # 빈 결과는 조건을 잘못 해석했을 가능성이 있으므로 served와 별도로 센다.
+  def record(self, tier: str, seconds: float, served: bool = True, empty: bool = False) -> None:
+    with self.lock:
+      stats = self.tiers[tier]
+      stats["requests"] += 1
+      stats["served" if served else "missed"] += 1
+      if served and empty:
+        stats["empty"] += 1
+      stats["total_seconds"] += seconds
+      stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      served_total = sum(stats["served"] for stats in self.tiers.values())
+      tiers = {
+        tier: {
+          "requests": stats["requests"],
+          "served": stats["served"],
+          "missed": stats["missed"],
+          "empty": stats["empty"],
+          "hit_ratio": stats["served"] / stats["requests"] if stats["requests"] else None,
+          "empty_ratio": stats["empty"] / stats["served"] if stats["served"] else None,
+          "share": stats["served"] / served_total if served_total else None,
+          "avg_latency_ms": stats["total_seconds"] / stats["requests"] * 1000 if stats["requests"] else None,
+          "max_latency_ms": stats["max_seconds"] * 1000,
+        }
+        for tier, stats in self.tiers.items()
+      }
+    return {
+      "tiers": tiers,
+      "thresholds": {
+        "local_max_residue_length": LOCAL_MAX_RESIDUE_LENGTH,
+        "fast_max_condition_length": FAST_MAX_CONDITION_LENGTH,
+        "fast_model": FAST_MODEL,
+        "search_model": SEARCH_MODEL,
+      }
+    }
@@ -0,0 +1,110 @@
+import os
+import msgpack
+from fastapi.testclient import TestClient
+
+os.environ["VALID_ACCESS_CODE"] = "test-access-code"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import main
+from main import app
+from wire_format import COMPACT_JSON_MEDIA_TYPE, COMPACT_MSGPACK_MEDIA_TYPE, decode_delta, decode_output
+
+client = TestClient(app)
+
+UDO_PRIVATE_TOUR = "https://experiences.myrealtrip.com/products/3739001"
+
+def test_tours_default_json_is_unchanged():
+  response = client.get("/api/tours", params={"location": "우도"})
+
+  assert response.headers["content-type"] == "application/json"
+  assert response.headers["vary"] == "Accept"
+  assert response.json()["id"] == "2"
+  assert len(response.json()["output"]["items"]) == 3
+
+def test_continue_without_delta_returns_full_output():
+  response = client.get("/api/tours/continue", params={"previous_response_id": "2"})
+
+  content = response.json()
+  assert content["id"] == "2-c"
+  assert "delta" not in content
+  assert len(content["output"]["items"]) == 2
+
+def test_continue_with_delta_returns_changes_against_parent():
+  client.get("/api/tours", params={"location": "우도"})
+
+  response = client.get("/api/tours/continue", params={"previous_response_id": "2", "delta": "true"})
+
+  content = response.json()
+  assert content["id"] == "2-c"
+  assert content["base_id"] == "2"
+  assert "output" not in content
+  assert content["delta"]["added"] == []
+  assert content["delta"]["removed"] == [UDO_PRIVATE_TOUR]
+  assert [filter["key"] for filter in content["delta"]["filters"]] == ["type", "includes"]
+
+def test_continue_from_continuation_with_delta_is_empty():
+  client.get("/api/tours/continue", params={"previous_response_id": "2"})
+
+  response = client.get("/api/tours/continue", params={"previous_response_id": "2-c", "delta": "true"})
+
+  content = response.json()
+  assert content["id"] == "2-c"
+  assert content["base_id"] == "2-c"
+  assert content["delta"] == {"added": [], "removed": [], "filters": [], "removed_filters": []}
+
+def test_compact_json_is_negotiated_by_accept():
+  full = client.get("/api/tours", params={"location": "우도"}).json()
+
+  response = client.get(
+    "/api/tours",
+    params={"location": "우도"},
+    headers={"Accept": COMPACT_JSON_MEDIA_TYPE}
+  )
+
+  assert response.headers["content-type"] == COMPACT_JSON_MEDIA_TYPE
+  assert response.headers["vary"] == "Accept"
+  assert decode_output(response.json()["output"]) == full["output"]
+
+def test_compact_msgpack_delta_is_negotiated_by_accept():
+  client.get("/api/tours", params={"location": "우도"})
+  delta = client.get(
+    "/api/tours/continue",
+    params={"previous_response_id": "2", "delta": "true"}
+  ).json()["delta"]
+
+  response = client.get(
+    "/api/tours/continue",
+    params={"previous_response_id": "2", "delta": "true"},
+    headers={"Accept": "application/x-msgpack"}
+  )
+
+  assert response.headers["content-type"] == COMPACT_MSGPACK_MEDIA_TYPE
+  assert response.headers["vary"] == "Accept"
+  assert decode_delta(msgpack.unpackb(response.content, raw=False)["delta"]) == delta
+
+class FakeOpenAIResponse:
+  id = "resp_test"
+  output_text = '{"filters": [], "items": []}'
+
+def test_open_ai_continue_without_previous_id_searches(monkeypatch):
+  calls = []
+  monkeypatch.setattr(main.client.responses, "create", lambda **kwargs: calls.append(kwargs) or FakeOpenAIResponse())
+
+  response = client.get(
+    "/api/tours/continue",
+    params={"access_code": "test-access-code", "condition": "성산일출봉 투어"}
+  )
+
+  assert response.status_code == 200
+  assert response.json()["id"] == "resp_test"
+  assert calls[0]["previous_response_id"] is None
+
+def test_open_ai_continue_from_evicted_local_id_is_not_found(monkeypatch):
+  monkeypatch.setattr(main.client.responses, "create", lambda **kwargs: FakeOpenAIResponse())
+
+  response = client.get(
+    "/api/tours/continue",
+    params={"access_code": "test-access-code", "previous_response_id": "local-evicted", "condition": "5만원 이하"}
+  )
+
+  assert response.status_code == 404
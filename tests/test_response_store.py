@@ -0,0 +1,81 @@
+from response_store import ResponseStore
+
+def stored_item(link: str, price: int = 10000) -> dict:
+  return {"title": link, "link": link, "price": price, "attributes": {"duration": "1시간"}}
+
+DURATION_FILTER = {
+  "key": "duration",
+  "label": "소요 시간",
+  "type": "single_select",
+  "options": [{"label": "1시간", "value": "1시간"}]
+}
+
+def test_diff_against_unknown_parent_is_none():
+  assert ResponseStore().diff("missing", {"filters": [], "items": []}) is None
+
+def test_diff_reports_added_removed_and_changed():
+  store = ResponseStore()
+  store.record("parent", {"filters": [DURATION_FILTER], "items": [stored_item("a"), stored_item("b"), stored_item("c")]})
+
+  delta = store.diff("parent", {"filters": [], "items": [stored_item("a"), stored_item("b", 5000), stored_item("d")]})
+
+  assert delta == {
+    "added": [stored_item("b", 5000), stored_item("d")],
+    "removed": ["c"],
+    "filters": [],
+    "removed_filters": ["duration"],
+  }
+
+def test_diff_sends_order_only_when_it_changes():
+  store = ResponseStore()
+  store.record("parent", {"filters": [], "items": [stored_item("a"), stored_item("b")]})
+
+  assert store.diff("parent", {"filters": [], "items": [stored_item("b"), stored_item("a")]})["order"] == ["b", "a"]
+
+def test_get_rebuilds_output_until_item_is_overwritten():
+  store = ResponseStore()
+  output = {"filters": [DURATION_FILTER], "items": [stored_item("a")]}
+  store.record("parent", output)
+  assert store.get("parent") == output
+
+  store.record("other", {"filters": [], "items": [stored_item("a", 5000)]})
+  assert store.get("parent") is None
+
+def test_responses_are_evicted_oldest_first():
+  store = ResponseStore(max_responses=1)
+  store.record("first", {"filters": [], "items": [stored_item("a")]})
+  store.record("second", {"filters": [], "items": [stored_item("b")]})
+
+  assert store.get("first") is None
+  assert store.get("second") is not None
+
+def test_malformed_outputs_are_not_recorded_or_diffed():
+  store = ResponseStore()
+  for output in [[], "text", {"items": None}, {"items": ["text"]}, {"filters": [{"key": "a", "options": "x"}]}]:
+    store.record("malformed", output)
+    assert store.get("malformed") is None
+
+  store.record("parent", {"filters": [], "items": [stored_item("a")]})
+  assert store.diff("parent", {"items": None}) is None
+
+def test_diff_sends_filter_order_only_when_it_changes():
+  store = ResponseStore()
+  a, b, c = (dict(DURATION_FILTER, key=key) for key in "abc")
+  store.record("parent", {"filters": [a, b], "items": []})
+
+  assert "filter_order" not in store.diff("parent", {"filters": [a, b, c], "items": []})
+  delta = store.diff("parent", {"filters": [b, c, a], "items": []})
+  assert delta["filters"] == [c]
+  assert delta["filter_order"] == ["b", "c", "a"]
+
+def test_diff_falls_back_without_links_or_with_duplicates():
+  store = ResponseStore()
+  store.record("parent", {"filters": [], "items": [stored_item("a")]})
+  linkless = {"title": "x", "price": 1000}
+
+  assert store.diff("parent", {"filters": [], "items": [linkless]}) is None
+  assert store.diff("parent", {"filters": [], "items": [stored_item("a"), stored_item("a")]}) is None
+  assert store.diff("parent", {"filters": [DURATION_FILTER, DURATION_FILTER], "items": []}) is None
+
+  store.record("linkless", {"filters": [], "items": [linkless]})
+  assert store.diff("linkless", {"filters": [], "items": [stored_item("a")]}) is None
@@ -0,0 +1,163 @@
+import pytest
+from router import (
+  FAST,
+  LOCAL,
+  SEARCH,
+  ResponseLineage,
+  RoutingStats,
+  classify_condition,
+  filter_locally,
+  narrow_output,
+  parse_fast_tier_indexes,
+)
+
+def tour(link: str, price, **attributes) -> dict:
+  return {"title": link, "link": link, "price": price, "region": "제주시", "attributes": attributes}
+
+def select_filter(key: str, *values) -> dict:
+  return {
+    "key": key,
+    "label": key,
+    "type": "single_select",
+    "options": [{"label": value, "value": value} for value in values]
+  }
+
+UDO = {
+  "filters": [
+    {"key": "price", "label": "가격", "type": "price"},
+    select_filter("type", "패키지 투어", "버스/티켓", "프라이빗 차량 투어"),
+  ],
+  "items": [
+    tour("package", 33800, type="패키지 투어"),
+    tour("bus", 5000, type="버스/티켓"),
+    tour("private", 40000, type="프라이빗 차량 투어"),
+  ]
+}
+
+HALLASAN = {
+  "filters": [select_filter("duration", "4시간", "4.5시간", "12시간")],
+  "items": [
+    tour("yeongsil", 30000, duration="4시간"),
+    tour("seongpanak", 30000, duration="4.5시간"),
+    tour("baengnokdam", 120000, duration="12시간"),
+  ]
+}
+
+def links(output: dict) -> list:
+  return [item["link"] for item in output["items"]]
+
+@pytest.mark.parametrize("condition, expected", [
+  ("가격 5만원 이하", ["package", "bus", "private"]),
+  ("3만원 이상으로", ["package", "private"]),
+  ("15,000원 이하", ["bus"]),
+  ("30,000원 이상", ["package", "private"]),
+  ("1만 5천원 이하", ["bus"]),
+  ("1만5000원 초과", ["package", "private"]),
+  ("3.5만원 미만", ["package", "bus"]),
+  ("패키지 투어만", ["package"]),
+  ("4만원 미만 패키지 투어", ["package"]),
+])
+def test_local_conditions(condition, expected):
+  assert classify_condition(condition, UDO) == LOCAL
+  assert links(filter_locally(condition, UDO)) == expected
+
+@pytest.mark.parametrize("condition", ["4시간 이상", "4시간 이하", "12시간 미만"])
+def test_comparator_next_to_option_is_not_local(condition):
+  assert classify_condition(condition, HALLASAN) == FAST
+
+def test_longest_option_wins_over_overlapping_option():
+  assert classify_condition("4.5시간", HALLASAN) == LOCAL
+  assert links(filter_locally("4.5시간", HALLASAN)) == ["seongpanak"]
+
+def test_leftover_digits_are_not_local():
+  assert classify_condition("2명 패키지 투어", UDO) != LOCAL
+
+@pytest.mark.parametrize("condition, expected", [
+  ("가이드 포함 제외", FAST),
+  ("오전에 출발하는 것만", FAST),
+  ("우도 근처 맛집 추천", SEARCH),
+  ("성산일출봉 투어", SEARCH),
+])
+def test_fast_and_search_conditions(condition, expected):
+  assert classify_condition(condition, UDO) == expected
+
+def test_parent_with_list_attribute_is_search():
+  parent = {
+    "filters": [select_filter("includes", "가이드", "점심")],
+    "items": [tour("guide", 30000, includes=["가이드", "점심"])]
+  }
+
+  assert classify_condition("가이드", parent) == SEARCH
+  assert classify_condition("가이드 포함된 것만", parent) == SEARCH
+
+def test_null_options_are_kept_as_is():
+  parent = {
+    "filters": [{"key": "region", "label": "위치", "type": "region", "options": None}],
+    "items": [tour("a", 1000), tour("b", 90000)]
+  }
+
+  assert classify_condition("5만원 이하", parent) == LOCAL
+  assert filter_locally("5만원 이하", parent) == {"filters": parent["filters"], "items": parent["items"][:1]}
+
+def test_unknown_parent_is_search():
+  assert classify_condition("가격 5만원 이하", None) == SEARCH
+
+def test_narrow_output_keeps_options_of_kept_items():
+  output = narrow_output(UDO, [1])
+  assert links(output) == ["bus"]
+  assert output["filters"][1]["options"] == [{"label": "버스/티켓", "value": "버스/티켓"}]
+
+def test_narrow_output_without_items_is_empty():
+  assert narrow_output(UDO, []) == {"filters": [], "items": []}
+
+def test_parse_fast_tier_indexes():
+  assert parse_fast_tier_indexes('{"links": ["bus", "unknown"]}', UDO) == [1]
+  assert parse_fast_tier_indexes('{"links": []}', UDO) == []
+  assert parse_fast_tier_indexes('{"links": ["unknown"]}', UDO) is None
+  assert parse_fast_tier_indexes('{"links": [["bus"]]}', UDO) is None
+  assert parse_fast_tier_indexes("not json", UDO) is None
+
+def test_linkless_items_are_selected_individually():
+  parent = {"filters": [], "items": [{"title": "x", "price": 1000}, {"title": "y", "price": 90000}]}
+
+  assert classify_condition("5만원 이하", parent) == LOCAL
+  assert filter_locally("5만원 이하", parent)["items"] == [{"title": "x", "price": 1000}]
+
+def test_linkless_parent_is_not_fast():
+  parent = {"filters": [], "items": [{"title": "x", "price": 1000}]}
+
+  assert classify_condition("오전에 출발하는 것만", parent) == SEARCH
+
+def test_lineage_accumulates_conditions_back_to_upstream_id():
+  lineage = ResponseLineage()
+  first = lineage.add("resp_1", "가격 5만원 이하")
+  second = lineage.add(first, "패키지 투어만")
+
+  assert lineage.resolve(second) == ("resp_1", ["가격 5만원 이하", "패키지 투어만"])
+  assert lineage.resolve("resp_2") == ("resp_2", [])
+
+def test_lineage_does_not_resolve_evicted_local_id():
+  lineage = ResponseLineage(max_entries=1)
+  first = lineage.add("resp_1", "가격 5만원 이하")
+  lineage.add("resp_1", "패키지 투어만")
+
+  assert lineage.is_expired(first)
+  assert not lineage.is_expired("resp_1")
+  assert not lineage.is_expired(None)
+  assert lineage.resolve(None) == (None, [])
+
+def test_routing_stats_snapshot():
+  stats = RoutingStats()
+  stats.record(FAST, 0.2)
+  stats.record(FAST, 0.4, served=False)
+  stats.record(LOCAL, 0.001)
+  stats.record(LOCAL, 0.001, empty=True)
+
+  fast = stats.snapshot()["tiers"][FAST]
+  assert fast["requests"] == 2
+  assert fast["hit_ratio"] == 0.5
+  assert fast["max_latency_ms"] == pytest.approx(400)
+  local = stats.snapshot()["tiers"][LOCAL]
+  assert local["hit_ratio"] == 1.0
+  assert local["empty"] == 1
+  assert local["empty_ratio"] == 0.5
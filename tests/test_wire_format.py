@@ -0,0 +1,69 @@
+import json
+import msgpack
+from wire_format import (
+  COMPACT_JSON_MEDIA_TYPE,
+  COMPACT_MSGPACK_MEDIA_TYPE,
+  decode_delta,
+  decode_output,
+  encode_delta,
+  encode_output,
+  negotiate_media_type,
+)
+
+OUTPUT = {
+  "filters": [
+    {"key": "price", "label": "가격", "type": "price"},
+    {"key": "region", "label": "위치", "type": "region", "options": None},
+    {
+      "key": "duration",
+      "label": "소요 시간",
+      "type": "single_select",
+      "options": [
+        {"label": "1시간", "value": "1시간"},
+        {"label": "두 시간", "value": "2시간"},
+        {"label": "라벨만"},
+        {"label": "추가", "value": "추가", "description": "설명"},
+      ]
+    }
+  ],
+  "items": [
+    {
+      "title": "상품 1",
+      "link": "https://example.com/1",
+      "price": 10000,
+      "attributes": {"duration": "1시간", "group_type": "프라이빗"}
+    },
+    {"title": "상품 2", "link": "https://example.com/2", "price": "20,000원"},
+    {"title": "상품 3", "attributes": None},
+    {"title": "상품 4", "region": "제주시", "attributes": {}},
+  ]
+}
+
+def test_output_round_trip():
+  assert decode_output(encode_output(OUTPUT)) == OUTPUT
+
+def test_output_round_trip_through_json_and_msgpack():
+  compact = encode_output(OUTPUT)
+  assert decode_output(json.loads(json.dumps(compact))) == OUTPUT
+  assert decode_output(msgpack.unpackb(msgpack.packb(compact, use_bin_type=True), raw=False)) == OUTPUT
+
+def test_option_with_same_label_and_value_is_single_index():
+  compact = encode_output(OUTPUT)
+  assert isinstance(compact["filters"][2]["options"][0], int)
+
+def test_delta_round_trip():
+  delta = {
+    "added": OUTPUT["items"][:1],
+    "removed": ["https://example.com/2"],
+    "filters": OUTPUT["filters"][2:],
+    "removed_filters": ["region"],
+  }
+  assert decode_delta(encode_delta(delta)) == delta
+
+def test_negotiate_media_type():
+  assert negotiate_media_type(None) is None
+  assert negotiate_media_type("application/json") is None
+  assert negotiate_media_type(COMPACT_JSON_MEDIA_TYPE) == COMPACT_JSON_MEDIA_TYPE
+  assert negotiate_media_type("application/x-msgpack") == COMPACT_MSGPACK_MEDIA_TYPE
+  assert negotiate_media_type(f"application/json;q=0.5, {COMPACT_JSON_MEDIA_TYPE}") == COMPACT_JSON_MEDIA_TYPE
+  assert negotiate_media_type(f"{COMPACT_JSON_MEDIA_TYPE};q=0, application/json") is None
@@ -0,0 +1,182 @@
+import json
+import msgpack
+from fastapi.responses import JSONResponse, Response
+from response_store import is_tours_output
+
+COMPACT_JSON_MEDIA_TYPE = "application/vnd.travel.compact+json"
+COMPACT_MSGPACK_MEDIA_TYPE = "application/vnd.travel.compact+msgpack"
+COMPACT_MEDIA_TYPES = {
+  COMPACT_JSON_MEDIA_TYPE: COMPACT_JSON_MEDIA_TYPE,
+  COMPACT_MSGPACK_MEDIA_TYPE: COMPACT_MSGPACK_MEDIA_TYPE,
+  "application/msgpack": COMPACT_MSGPACK_MEDIA_TYPE,
+  "application/x-msgpack": COMPACT_MSGPACK_MEDIA_TYPE,
+}
+COMPACT_VERSION = 1
+ABSENT = -1
+
+# 압축 포맷은 Accept 헤더로 명시적으로 요청한 경우에만 사용하고, 기본 응답은 기존 JSON 형태를 그대로 유지한다.
+def negotiate_media_type(accept: str = None) -> str:
+  if not accept:
+    return None
+
+  candidates = []
+  for position, part in enumerate(accept.split(",")):
+    media_type, *params = [token.strip() for token in part.split(";")]
+    quality = 1.0
+    for param in params:
+      name, _, value = param.partition("=")
+      if name.strip() == "q":
+        try:
+          quality = float(value)
+        except ValueError:
+          quality = 0.0
+    if quality > 0:
+      candidates.append((-quality, position, media_type.lower()))
+
+  for _, _, media_type in sorted(candidates):
+    if media_type in COMPACT_MEDIA_TYPES:
+      return COMPACT_MEDIA_TYPES[media_type]
+    if media_type in ("application/json", "application/*", "*/*"):
+      return None
+  return None
+
+class _Table:
+  def __init__(self):
+    self.values = []
+    self.indexes = {}
+
+  def index(self, value) -> int:
+    key = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    if key not in self.indexes:
+      self.indexes[key] = len(self.values)
+      self.values.append(value)
+    return self.indexes[key]
+
+def _has_attributes(item: dict) -> bool:
+  return isinstance(item.get("attributes"), dict)
+
+def _encode_option(strings: _Table, option: dict):
+  if set(option) != {"label", "value"}:
+    return {key: strings.index(value) for key, value in option.items()}
+  if option["label"] == option["value"]:
+    return strings.index(option["value"])
+  return [strings.index(option["label"]), strings.index(option["value"])]
+
+def _decode_option(strings: list, option) -> dict:
+  if isinstance(option, int):
+    return {"label": strings[option], "value": strings[option]}
+  if isinstance(option, list):
+    return {"label": strings[option[0]], "value": strings[option[1]]}
+  return {key: strings[index] for key, index in option.items()}
+
+# items는 필드별 컬럼으로, attributes는 (key 인덱스, 문자열 인덱스) 쌍으로 펼치고
+# label과 value가 같은 옵션은 문자열 인덱스 하나로 보낸다.
+# attributes가 없는 상품은 None으로, label/value 외의 키가 있는 옵션은 키별 인덱스 객체로 보내서 원래 형태를 그대로 복원한다.
+def encode_output(output: dict) -> dict:
+  strings = _Table()
+  keys = _Table()
+  fields = []
+
+  items = output.get("items", [])
+  for item in items:
+    for field in item:
+      if (field != "attributes" or not _has_attributes(item)) and field not in fields:
+        fields.append(field)
+
+  columns = [
+    [
+      strings.index(item[field])
+      if field in item and (field != "attributes" or not _has_attributes(item))
+      else ABSENT
+      for item in items
+    ]
+    for field in fields
+  ]
+  attributes = []
+  for item in items:
+    if not _has_attributes(item):
+      attributes.append(None)
+      continue
+    pairs = []
+    for key, value in item["attributes"].items():
+      pairs.append(keys.index(key))
+      pairs.append(strings.index(value))
+    attributes.append(pairs)
+
+  filters = []
+  for filter in output.get("filters", []):
+    compact_filter = {key: value for key, value in filter.items() if key != "options"}
+    if "options" in filter:
+      options = filter["options"]
+      compact_filter["options"] = (
+        None if options is None else [_encode_option(strings, option) for option in options]
+      )
+    filters.append(compact_filter)
+
+  return {
+    "v": COMPACT_VERSION,
+    "strings": strings.values,
+    "keys": keys.values,
+    "fields": fields,
+    "items": columns,
+    "attributes": attributes,
+    "filters": filters,
+  }
+
+def decode_output(compact: dict) -> dict:
+  strings = compact["strings"]
+  keys = compact["keys"]
+
+  items = []
+  for position, pairs in enumerate(compact["attributes"]):
+    item = {}
+    for field, column in zip(compact["fields"], compact["items"]):
+      if column[position] != ABSENT:
+        item[field] = strings[column[position]]
+    if pairs is not None:
+      item["attributes"] = {
+        keys[pairs[i]]: strings[pairs[i + 1]] for i in range(0, len(pairs), 2)
+      }
+    items.append(item)
+
+  filters = []
+  for compact_filter in compact["filters"]:
+    filter = {key: value for key, value in compact_filter.items() if key != "options"}
+    if "options" in compact_filter:
+      options = compact_filter["options"]
+      filter["options"] = (
+        None if options is None else [_decode_option(strings, option) for option in options]
+      )
+    filters.append(filter)
+
+  return {"filters": filters, "items": items}
+
+# delta 응답은 추가된 상품과 바뀐 필터를 같은 압축 포맷으로 보내고, 나머지 필드는 그대로 둔다.
+def encode_delta(delta: dict) -> dict:
+  compact = encode_output({"filters": delta["filters"], "items": delta["added"]})
+  for key in ("removed", "removed_filters", "order", "filter_order"):
+    if key in delta:
+      compact[key] = delta[key]
+  return compact
+
+def decode_delta(compact: dict) -> dict:
+  output = decode_output(compact)
+  delta = {key: compact[key] for key in ("removed", "removed_filters", "order", "filter_order") if key in compact}
+  return {"added": output["items"], "filters": output["filters"], **delta}
+
+def tours_response(content: dict, accept: str = None) -> Response:
+  media_type = negotiate_media_type(accept)
+  headers = {"Vary": "Accept"}
+  # 명세와 다른 형태의 출력은 압축하지 않고 기본 JSON으로 그대로 내려준다.
+  if media_type is None or ("output" in content and not is_tours_output(content["output"])):
+    return JSONResponse(content=content, headers=headers)
+
+  if "delta" in content:
+    compact_content = {**content, "delta": encode_delta(content["delta"])}
+  else:
+    compact_content = {**content, "output": encode_output(content["output"])}
+  if media_type == COMPACT_MSGPACK_MEDIA_TYPE:
+    body = msgpack.packb(compact_content, use_bin_type=True)
+  else:
+    body = json.dumps(compact_content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+  return Response(content=body, media_type=media_type, headers=headers)